@@ -1,8 +1,17 @@
 import networkx as nx
 import json
-from .spotify_api import get_playlist_artists
+from .spotify_api import iter_playlist_artists
+from . import metrics
 import os
+import glob
 import hashlib
+import tempfile
+import threading
+
+# Errors raised by load_graph when a snapshot file is not valid node-link JSON
+UNREADABLE_GRAPH_ERRORS = (json.JSONDecodeError, KeyError, nx.NetworkXError)
+
+ARTIST_INFO_FIELDS = ('details', 'connections', 'genres', 'degree', 'betweenness', 'strength')
 
 class ArtistGraph:
     def __init__(self):
@@ -11,6 +20,8 @@ class ArtistGraph:
         This graph will use artist names as nodes and shared playlists as weights for edges.
         """
         self.graph = nx.Graph()
+        # Held by readers of the graph; GlobalArtistGraph also holds it while merging
+        self.lock = threading.RLock()
     
     def reset_graph(self):
         """Clears the current graph to allow for a new build."""
@@ -67,7 +78,7 @@ class ArtistGraph:
         Parameters:
             filename (str): The name of the file to save the graph to.
         """
-        with open(filename, 'w') as f:
+        with metrics.span('json_save'), open(filename, 'w') as f:
             json.dump(nx.node_link_data(self.graph), f)
 
     def load_graph(self, filename):
@@ -81,7 +92,7 @@ class ArtistGraph:
             bool: True if the graph was successfully loaded, False otherwise.
         """
         try:
-            with open(filename, 'r') as f:
+            with open(filename, 'r') as f, metrics.span('json_load'):
                 data = json.load(f)
                 self.graph = nx.node_link_graph(data)
                 return True
@@ -140,7 +151,7 @@ class ArtistGraph:
             for neighbor in self.graph.neighbors(artist_name):
                 connection_details = {
                     'artist_name': neighbor,
-                    'shared_playlists': self.graph[artist_name][neighbor]['playlists']
+                    'shared_playlists': self.graph[artist_name][neighbor].get('playlists', [])
                 }
                 details['connections'].append(connection_details)
                 details['playlists'].extend(connection_details['shared_playlists'])
@@ -211,6 +222,46 @@ class ArtistGraph:
             return nx.betweenness_centrality(self.graph)[artist_name]
         return 0
     
+    def get_artists_info(self, artist_names, fields=ARTIST_INFO_FIELDS):
+        """
+        Resolve several artists against the current graph in one pass.
+        Graph-wide metrics are computed at most once per call, however many artists are requested.
+
+        Parameters:
+            artist_names (list): The artist names (node ids) to resolve.
+            fields (iterable): The fields to include, a subset of ARTIST_INFO_FIELDS.
+
+        Returns:
+            tuple: A dict mapping each found artist to its requested fields, and a list of
+                the artists that are not in the graph.
+        """
+        fields = set(fields)
+        requested = list(dict.fromkeys(artist_names))
+        found = [artist for artist in requested if artist in self.graph]
+        missing = [artist for artist in requested if artist not in self.graph]
+
+        degree = nx.degree_centrality(self.graph) if 'degree' in fields and found else {}
+        betweenness = nx.betweenness_centrality(self.graph) if 'betweenness' in fields and found else {}
+
+        artists = {}
+        for artist in found:
+            node = self.graph.nodes[artist]
+            info = {}
+            if 'details' in fields:
+                info['details'] = dict(node)
+            if 'connections' in fields:
+                info['connections'] = list(self.graph.neighbors(artist))
+            if 'genres' in fields:
+                info['genres'] = node.get('genres', [])
+            if 'degree' in fields:
+                info['degree'] = degree[artist]
+            if 'betweenness' in fields:
+                info['betweenness'] = betweenness[artist]
+            if 'strength' in fields:
+                info['strength'] = self.graph.degree(artist, weight='weight')
+            artists[artist] = info
+        return artists, missing
+
     def get_artist_shared_tracks(self, artist_name):
         """
         Get tracks that the given artist shares with other artists in the graph.
@@ -322,11 +373,12 @@ class ArtistGraph:
     #             else:
     #                 self.graph.add_edge(artist1, artist2, weight=count)
 
-    def build_category_graph(self, playlists_data):
+    def build_category_graph(self, playlists_data, category_id=None):
         """
         Build a graph where each artist is a node, and an edge is created between every pair
         of artists who appear in the same playlist more than once. The weight of the edge
         is the count of how many times they have shared in the same playlist.
+        The category id is stored in the graph attributes of newly built snapshots.
         """
         playlists_string = json.dumps(playlists_data, sort_keys=True)
         hash_object = hashlib.sha256(playlists_string.encode('utf-8'))
@@ -335,36 +387,221 @@ class ArtistGraph:
         self.graph.clear()
         pairs = {}
 
-        if not self.load_graph(f"data/{graph_id}.json"):
+        if self.load_graph(f"data/{graph_id}.json"):
+            metrics.GRAPH_CACHE.inc(('hit',))
+        else:
+            metrics.GRAPH_CACHE.inc(('miss',))
             for playlist in playlists_data:
                 playlist_id = playlist['id']
-                    
-                artists_info = get_playlist_artists(playlist_id)
-                artist_names = list(artists_info.keys())
-
-                for i in range(len(artist_names)):
-                    for j in range(i + 1, len(artist_names)):
-                        pair = frozenset([artist_names[i], artist_names[j]])
-                        pairs[pair] = pairs.get(pair, 0) + 1
-                    
-                        # pairs[pair].append(playlist['name'])
-
-                for artist_name, details in artists_info.items():
-                    self.add_artist(artist_name, details)
-
-            for pair, shared_count in pairs.items():
-                if shared_count > 1:
-                    artist1, artist2 = pair
-                    if self.graph.has_edge(artist1, artist2):
-                        self.graph[artist1][artist2]['weight'] += shared_count
-                    else:
-                        self.graph.add_edge(artist1, artist2, weight=shared_count)
-            
+                artist_names = []
+                seen_names = set()
+
+                # Pair each page's new artists with every artist seen earlier in the playlist
+                for artists_info in iter_playlist_artists(playlist_id):
+                    with metrics.span('pair_artists'):
+                        for artist_name, details in artists_info.items():
+                            if artist_name in seen_names:
+                                continue
+                            for other_name in artist_names:
+                                pair = frozenset([other_name, artist_name])
+                                pairs[pair] = pairs.get(pair, 0) + 1
+                            artist_names.append(artist_name)
+                            seen_names.add(artist_name)
+                            self.add_artist(artist_name, details)
+
+            with metrics.span('build_edges'):
+                for pair, shared_count in pairs.items():
+                    if shared_count > 1:
+                        artist1, artist2 = pair
+                        if self.graph.has_edge(artist1, artist2):
+                            self.graph[artist1][artist2]['weight'] += shared_count
+                        else:
+                            self.graph.add_edge(artist1, artist2, weight=shared_count)
+
+            self.graph.graph['category'] = category_id
             self.save_graph(f"data/{graph_id}.json")
 
         return graph_id
 
 
+class GlobalArtistGraph(ArtistGraph):
+    def __init__(self, filename="data/global/artist_graph.json"):
+        """
+        Initialize the union graph of every category built so far.
+
+        Each category counts once: the union keeps the nodes and edge weights each category
+        contributed, and merging a newer snapshot of a category first subtracts that category's
+        previous contribution. Edge weights therefore sum shared-playlist counts across
+        categories, not across reloads. The contributions are kept in the graph attributes and
+        persisted to `filename` with the graph.
+
+        Parameters:
+            filename (str): The file the union graph is persisted to.
+        """
+        super().__init__()
+        self.filename = filename
+        try:
+            self.load_graph(filename)
+        except UNREADABLE_GRAPH_ERRORS as e:
+            print(f"Could not read global artist graph {filename}, starting empty: {e!r}")
+            self.graph = nx.Graph()
+        if 'contributions' not in self.graph.graph:
+            if self.graph.number_of_nodes():
+                print(f"Global artist graph {filename} has no category contributions, starting empty")
+            self.graph = nx.Graph(contributions={})
+
+    def contributions(self):
+        """
+        Return the contributions merged into the union graph, keyed by category.
+
+        Returns:
+            dict: Maps each category key to its snapshot id, artists and weighted edges.
+        """
+        return self.graph.graph['contributions']
+
+    def merged_snapshots(self):
+        """
+        Return the ids of the category snapshots currently merged into the union graph.
+
+        Returns:
+            set: The graph ids (the snapshot file names without extension).
+        """
+        return {contribution['snapshot'] for contribution in self.contributions().values()}
+
+    def _subtract_contribution(self, category):
+        """Remove a category's previous edge weights and the artists no other category contributed."""
+        contribution = self.contributions().pop(category, None)
+        if contribution is None:
+            return
+
+        for artist1, artist2, weight in contribution['edges']:
+            if self.graph.has_edge(artist1, artist2):
+                self.graph[artist1][artist2]['weight'] -= weight
+                if self.graph[artist1][artist2]['weight'] <= 0:
+                    self.graph.remove_edge(artist1, artist2)
+
+        remaining_artists = set()
+        for other in self.contributions().values():
+            remaining_artists.update(other['artists'])
+        for artist_name in contribution['artists']:
+            if artist_name not in remaining_artists and self.graph.has_node(artist_name):
+                self.graph.remove_node(artist_name)
+
+    def merge_snapshot(self, category, graph_id, snapshot, save=True):
+        """
+        Merge a category snapshot into the union graph, replacing that category's previous
+        contribution. Artist details are updated with the snapshot values and edge weights
+        are summed with those of the other categories.
+
+        Parameters:
+            category (str): The key the contribution is recorded under, usually the category id.
+            graph_id (str): The id of the snapshot, as returned by build_category_graph.
+            snapshot (networkx.Graph): The category graph to merge.
+            save (bool): Whether to persist the union graph after merging.
+
+        Returns:
+            bool: True if the snapshot was merged, False if it is already the category's contribution.
+        """
+        with self.lock:
+            previous = self.contributions().get(category)
+            if previous is not None and previous['snapshot'] == graph_id:
+                return False
+
+            self._subtract_contribution(category)
+
+            for artist_name, details in snapshot.nodes(data=True):
+                self.add_artist(artist_name, details)
+
+            edges = []
+            for artist1, artist2, data in snapshot.edges(data=True):
+                weight = data.get('weight', 0)
+                if self.graph.has_edge(artist1, artist2):
+                    self.graph[artist1][artist2]['weight'] += weight
+                else:
+                    self.graph.add_edge(artist1, artist2, weight=weight)
+                edges.append([artist1, artist2, weight])
+
+            self.contributions()[category] = {
+                'snapshot': graph_id,
+                'artists': list(snapshot.nodes()),
+                'edges': edges
+            }
+            if save:
+                self.save_graph()
+            return True
+
+    def backfill(self, data_dir="data"):
+        """
+        Merge the cached category snapshots found in `data_dir` into the union graph.
+
+        Snapshots record the category they were built for, and only the most recently written
+        snapshot of each category is merged. Categories already in the union graph are left
+        as they are, since live merges are more recent than any cache file. Older snapshots
+        that predate the category attribute cannot be matched to a category and are merged
+        under their own graph id.
+
+        Parameters:
+            data_dir (str): The directory holding the `<graph_id>.json` snapshot files.
+
+        Returns:
+            tuple: The ids of the snapshots that were newly merged, and the paths of the
+                files that were skipped because they could not be read.
+        """
+        merged = []
+        skipped = []
+        snapshot = ArtistGraph()
+        paths = sorted(glob.glob(os.path.join(data_dir, '*.json')), key=os.path.getmtime, reverse=True)
+
+        with self.lock:
+            for path in paths:
+                graph_id = os.path.splitext(os.path.basename(path))[0]
+                if graph_id in self.merged_snapshots():
+                    continue
+                try:
+                    if not snapshot.load_graph(path):
+                        continue
+                except UNREADABLE_GRAPH_ERRORS as e:
+                    print(f"Skipping unreadable snapshot {path}: {e!r}")
+                    skipped.append(path)
+                    continue
+
+                category = snapshot.graph.graph.get('category') or graph_id
+                if category in self.contributions():
+                    continue
+                if self.merge_snapshot(category, graph_id, snapshot.graph, save=False):
+                    merged.append(graph_id)
+
+            if merged:
+                self.save_graph()
+        return merged, skipped
+
+    def save_graph(self, filename=None):
+        """
+        Serialize the union graph to its JSON file, creating the directory if needed.
+        The graph is written to a uniquely named temporary file first and then moved into
+        place, so neither a crash nor a concurrent save leaves a truncated file behind.
+
+        Parameters:
+            filename (str): The file to save to. Defaults to the graph's own file.
+        """
+        filename = filename or self.filename
+        directory = os.path.dirname(filename)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self.lock:
+            with metrics.span('json_save'), tempfile.NamedTemporaryFile(
+                    'w', dir=directory or '.', suffix='.tmp', delete=False) as f:
+                temp_filename = f.name
+                try:
+                    json.dump(nx.node_link_data(self.graph), f)
+                except Exception:
+                    f.close()
+                    os.remove(temp_filename)
+                    raise
+            os.replace(temp_filename, filename)
+
+
 # if __name__ == "__main__":
 #     ag = ArtistGraph()
 #     ag.add_artist("Artist A")
@@ -12,6 +12,9 @@ def create_app():
 
     # cache.init_app(app)
     
+    from . import metrics
+    metrics.init_app(app)
+
     from .views import main
     app.register_blueprint(main)
 
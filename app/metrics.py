@@ -0,0 +1,225 @@
+import os
+import time
+import threading
+from contextlib import contextmanager, nullcontext
+from urllib.parse import urlparse
+from flask import g, request, has_request_context
+
+# Set METRICS_ENABLED=0 to turn all instrumentation into no-ops
+ENABLED = os.environ.get('METRICS_ENABLED', '1') != '0'
+
+# Requests carrying this header get a Server-Timing breakdown of their spans
+PROFILE_HEADER = 'X-Profile'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_lock = threading.Lock()
+
+
+class Counter:
+    def __init__(self, name, help_text, label_names):
+        """
+        A monotonically increasing value per combination of label values.
+
+        Parameters:
+            name (str): The Prometheus metric name.
+            help_text (str): The description shown in the HELP line.
+            label_names (tuple): The names of the labels.
+        """
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.values = {}
+
+    def inc(self, labels, amount=1):
+        """Add `amount` to the value for the given label values."""
+        if not ENABLED:
+            return
+        with _lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        """Return the metric as lines of the Prometheus text format."""
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with _lock:
+            for labels, value in sorted(self.values.items()):
+                lines.append(f'{self.name}{_format_labels(self.label_names, labels)} {value}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, label_names, buckets=LATENCY_BUCKETS):
+        """
+        A distribution of observed values per combination of label values.
+
+        Parameters:
+            name (str): The Prometheus metric name.
+            help_text (str): The description shown in the HELP line.
+            label_names (tuple): The names of the labels.
+            buckets (tuple): The upper bounds of the buckets, in ascending order.
+        """
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self.values = {}
+
+    def observe(self, labels, value):
+        """Record one observation for the given label values."""
+        if not ENABLED:
+            return
+        with _lock:
+            bucket_counts, total, count = self.values.get(labels, ([0] * len(self.buckets), 0.0, 0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    bucket_counts[i] += 1
+            self.values[labels] = (bucket_counts, total + value, count + 1)
+
+    def render(self):
+        """Return the metric as lines of the Prometheus text format."""
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        bucket_label_names = self.label_names + ('le',)
+        with _lock:
+            for labels, (bucket_counts, total, count) in sorted(self.values.items()):
+                for bound, bucket_count in zip(self.buckets, bucket_counts):
+                    bucket_labels = _format_labels(bucket_label_names, labels + (bound,))
+                    lines.append(f'{self.name}_bucket{bucket_labels} {bucket_count}')
+                bucket_labels = _format_labels(bucket_label_names, labels + ('+Inf',))
+                lines.append(f'{self.name}_bucket{bucket_labels} {count}')
+                lines.append(f'{self.name}_sum{_format_labels(self.label_names, labels)} {total}')
+                lines.append(f'{self.name}_count{_format_labels(self.label_names, labels)} {count}')
+        return lines
+
+
+def _format_labels(label_names, labels):
+    """Format label names and values as a Prometheus label set."""
+    pairs = []
+    for name, value in zip(label_names, labels):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+REQUEST_LATENCY = Histogram('artist_network_request_duration_seconds',
+                            'Latency of HTTP requests per route.', ('route', 'method', 'status'))
+PHASE_LATENCY = Histogram('artist_network_phase_duration_seconds',
+                          'Time spent in each instrumented phase.', ('phase',))
+SPOTIFY_CALLS = Counter('artist_network_spotify_requests_total',
+                        'Spotify API requests sent, per endpoint and status code.', ('endpoint', 'status'))
+SPOTIFY_RETRIES = Counter('artist_network_spotify_retries_total',
+                          'Spotify API requests retried after a 429 response.', ('endpoint',))
+SPOTIFY_BYTES = Counter('artist_network_spotify_response_bytes_total',
+                        'Bytes received from the Spotify API, from Content-Length or the decoded body size '
+                        'when the header is absent.', ('endpoint',))
+SPOTIFY_RETRY_SLEEP = Counter('artist_network_spotify_retry_sleep_seconds_total',
+                              'Seconds slept waiting on Spotify rate limits.', ('endpoint',))
+GRAPH_CACHE = Counter('artist_network_graph_cache_total',
+                      'Category graph cache lookups, by result (hit or miss).', ('result',))
+
+REGISTRY = (REQUEST_LATENCY, PHASE_LATENCY, SPOTIFY_CALLS, SPOTIFY_RETRIES,
+            SPOTIFY_BYTES, SPOTIFY_RETRY_SLEEP, GRAPH_CACHE)
+
+# Path segments followed by a Spotify id, collapsed so endpoint labels stay bounded
+_ID_SEGMENTS = {'artists', 'playlists', 'categories', 'albums', 'tracks', 'users'}
+
+
+def spotify_endpoint(url):
+    """
+    Return the templated Spotify endpoint for a request URL, e.g. `/v1/playlists/{id}/tracks`.
+
+    Parameters:
+        url (str): The full request URL.
+
+    Returns:
+        str: The URL path with ids replaced by `{id}`.
+    """
+    segments = urlparse(url).path.split('/')
+    for i in range(1, len(segments)):
+        if segments[i - 1] in _ID_SEGMENTS and segments[i]:
+            segments[i] = '{id}'
+    return '/'.join(segments)
+
+
+def _record_span(name, duration):
+    """Record a finished span in the phase histogram and the current request's profile."""
+    PHASE_LATENCY.observe((name,), duration)
+    if has_request_context() and g.get('profile_spans') is not None:
+        g.profile_spans.append((name, duration))
+
+
+@contextmanager
+def _span(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record_span(name, time.perf_counter() - start)
+
+
+def span(name):
+    """
+    Time the enclosed block as the phase `name`.
+
+    Parameters:
+        name (str): The phase name used as the `phase` label.
+
+    Returns:
+        A context manager; a no-op when metrics are disabled.
+    """
+    if not ENABLED:
+        return nullcontext()
+    return _span(name)
+
+
+def render_metrics():
+    """
+    Render every registered metric in the Prometheus text exposition format.
+
+    Returns:
+        str: The metrics page body.
+    """
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def init_app(app):
+    """
+    Register the per-request timing and profiling hooks on the Flask app.
+
+    Parameters:
+        app (Flask): The application to instrument.
+    """
+    if not ENABLED:
+        return
+
+    @app.before_request
+    def start_request_timer():
+        g.request_start = time.perf_counter()
+        g.profile_spans = [] if request.headers.get(PROFILE_HEADER) else None
+
+    @app.after_request
+    def add_server_timing(response):
+        g.response_status = response.status_code
+        spans = g.get('profile_spans')
+        start = g.get('request_start')
+        if spans is not None and start is not None:
+            totals = {}
+            for name, span_duration in spans:
+                totals[name] = totals.get(name, 0) + span_duration
+            timings = [f'{name};dur={span_duration * 1000:.1f}' for name, span_duration in totals.items()]
+            timings.append(f'total;dur={(time.perf_counter() - start) * 1000:.1f}')
+            response.headers['Server-Timing'] = ', '.join(timings)
+        return response
+
+    # Teardown also runs when an unhandled exception skips after_request, so failed requests are timed too
+    @app.teardown_request
+    def record_request(exception):
+        start = g.get('request_start')
+        if start is None:
+            return
+        duration = time.perf_counter() - start
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        status = g.get('response_status', 500)
+        REQUEST_LATENCY.observe((route, request.method, status), duration)
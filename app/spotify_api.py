@@ -1,6 +1,8 @@
 import requests
+from urllib.parse import urlencode
 from flask import session, request, redirect, url_for
 import time
+from . import metrics
 
 def init_spotify_auth(client_id, client_secret, redirect_uri):
     """
@@ -68,18 +70,29 @@ def make_spotify_request(url, method='GET', data=None):
         'Authorization': f"Bearer {session.get('access_token')}",
         'Content-Type': 'application/json'
     }
+    endpoint = metrics.spotify_endpoint(url) if metrics.ENABLED else None
     for attempt in range(5):
-        if method == 'POST':
-            response = requests.post(url, headers=headers, json=data)
-        else:
-            response = requests.get(url, headers=headers)
+        with metrics.span('spotify_request'):
+            if method == 'POST':
+                response = requests.post(url, headers=headers, json=data)
+            else:
+                response = requests.get(url, headers=headers)
+        metrics.SPOTIFY_CALLS.inc((endpoint, response.status_code))
+        if metrics.ENABLED:
+            # Content-Length is the size on the wire; the body is decompressed once read
+            content_length = response.headers.get('Content-Length')
+            received = int(content_length) if content_length else len(response.content)
+            metrics.SPOTIFY_BYTES.inc((endpoint,), received)
 
         if response.status_code == 200:
             return response.json()
         elif response.status_code == 429:
             retry_after = int(response.headers.get('Retry-After', 1))
             print(f"Rate limit exceeded. Retrying after {retry_after} seconds...")
-            time.sleep(retry_after)
+            metrics.SPOTIFY_RETRIES.inc((endpoint,))
+            metrics.SPOTIFY_RETRY_SLEEP.inc((endpoint,), retry_after)
+            with metrics.span('rate_limit_sleep'):
+                time.sleep(retry_after)
         else:
             response.raise_for_status()
     raise Exception("Max retry attempts exceeded")
@@ -106,6 +119,54 @@ def get_artist_details(artist_id):
         print(f"HTTP Error: {e}")
         return None
 
+PLAYLIST_TRACKS_PAGE_SIZE = 100
+PLAYLIST_TRACKS_FIELDS = 'next,items(track(artists(id,name)))'
+
+def iter_playlist_artists(playlist_id):
+    """
+    Streams the artists of the given Spotify playlist page by page.
+
+    Each `/tracks` page is requested at the maximum page size and projected with `fields=`
+    down to the track artists' ids and names, so only the data used to build the graph is
+    transferred and only one page is held in memory at a time.
+
+    Parameters:
+        playlist_id (str): The Spotify ID for the playlist.
+
+    Yields:
+        dict: The artists first seen on a page, keyed by artist name with artist details as values.
+    """
+    base_url = f'https://api.spotify.com/v1/playlists/{playlist_id}/tracks'
+    seen_ids = set()
+    offset = 0
+    while True:
+        params = urlencode({
+            'limit': PLAYLIST_TRACKS_PAGE_SIZE,
+            'offset': offset,
+            'fields': PLAYLIST_TRACKS_FIELDS
+        })
+        response = make_spotify_request(f'{base_url}?{params}')
+        page_artists = {}
+        for item in response.get('items') or []:
+            track = item.get('track')
+            if track is None:
+                continue
+            for artist in track.get('artists', []):
+                artist_id = artist.get('id')
+                # Local files have artists without a Spotify ID
+                if artist_id is None or artist_id in seen_ids:
+                    continue
+                # Artists whose details failed to load are retried on their next track
+                details = get_artist_details(artist_id)
+                if details:
+                    seen_ids.add(artist_id)
+                    page_artists[artist['name']] = details
+        if page_artists:
+            yield page_artists
+        if not response.get('next'):
+            break
+        offset += PLAYLIST_TRACKS_PAGE_SIZE
+
 def get_playlist_artists(playlist_id):
     """
     Fetches the artists and their details from the given Spotify playlist.
@@ -116,23 +177,9 @@ def get_playlist_artists(playlist_id):
     Returns:
         dict: A dictionary where each key is an artist name and each value is artist details.
     """
-    url = f'https://api.spotify.com/v1/playlists/{playlist_id}/tracks'
     artist_details = {}
-    while url:
-        response = make_spotify_request(url)
-        for item in response.get('items', []):
-            track = item.get('track')
-            if track is None:
-                continue   
-            for artist in track.get('artists', []):
-                artist_id = artist['id']
-                artist_name = artist['name']
-                if artist_id not in artist_details:
-                    details = get_artist_details(artist_id)
-                    if details:
-                        artist_details[artist_name] = details
-        url = response.get('next')
-
+    for page_artists in iter_playlist_artists(playlist_id):
+        artist_details.update(page_artists)
     return artist_details
 
 def get_categories():
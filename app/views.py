@@ -1,13 +1,21 @@
-from flask import Blueprint, render_template, session, redirect, url_for, request, jsonify
+from flask import Blueprint, render_template, session, redirect, url_for, request, jsonify, Response
 from .spotify_api import init_spotify_auth, spotify_login, spotify_callback, get_categories, get_category_playlists
-from app.DataStructure import ArtistGraph
+from app.DataStructure import ArtistGraph, GlobalArtistGraph, ARTIST_INFO_FIELDS
 import networkx as nx
+from . import metrics
 from bleach import clean
 # from . import cache
 
 main = Blueprint('main', __name__)
 
 artist_graph = ArtistGraph()
+global_graph = GlobalArtistGraph()
+
+def select_graph():
+    """Return the union graph when the request asks for `?scope=global`, else the current category graph."""
+    if request.args.get('scope') == 'global':
+        return global_graph
+    return artist_graph
 
 @main.route('/')
 def index():
@@ -37,6 +45,11 @@ def callback():
     # session['logged_in'] = True
     return redirect(url_for('main.categories'))
 
+@main.route('/metrics', methods=['GET'])
+def metrics_page():
+    """Expose request latencies, build phase timings, Spotify call accounting and cache counters for Prometheus."""
+    return Response(metrics.render_metrics(), mimetype='text/plain; version=0.0.4')
+
 @main.route('/spotify/categories', methods=['GET'])
 def categories():
     """Retrieve and display Spotify categories to the user."""
@@ -52,36 +65,48 @@ def artist_network_by_category(category_id):
     Build and return a graph of artists based on the selected Spotify category.
     Extracts playlists for a category and uses them to build the graph.
     """
-    playlists = get_category_playlists(category_id)
-    #artist_graph.reset_graph()
-    artist_graph.build_category_graph(playlists)
-    data = nx.readwrite.json_graph.node_link_data(artist_graph.graph) 
-    return jsonify(data)
+    try:
+        playlists = get_category_playlists(category_id)
+        #artist_graph.reset_graph()
+        with metrics.span('build_category_graph'):
+            graph_id = artist_graph.build_category_graph(playlists, category_id)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    try:
+        with metrics.span('merge_global_graph'):
+            global_graph.merge_snapshot(category_id, graph_id, artist_graph.graph)
+    except Exception as e:
+        print(f"Could not merge category {category_id} into the global artist graph: {e!r}")
+    with metrics.span('serialize'):
+        data = nx.readwrite.json_graph.node_link_data(artist_graph.graph)
+        return jsonify(data)
 
 ##############################################################################################
 # @cache.cached(timeout=86400)
 @main.route('/api/search_artist/<path:artist_name>', methods=['GET'])
 def get_artist(artist_name):
     """Return details about an artist, including their connections and influence metrics."""
+    graph = select_graph()
     try:
-        artist_name = clean(artist_name)
-        artist_details = artist_graph.get_artist_details(artist_name)
-        if artist_details:
-            connections = artist_graph.get_connections(artist_name)
-            degree = artist_graph.degree_centrality(artist_name)
-            betweenness = artist_graph.betweenness_centrality(artist_name)
-
-            artist_info = {
-                'details': artist_details,
-                'connections': connections,
-                'influence': {
-                    'degree_centrality': degree,
-                    'betweenness_centrality': betweenness
+        with graph.lock:
+            artist_name = clean(artist_name)
+            artist_details = graph.get_artist_details(artist_name)
+            if artist_details:
+                connections = graph.get_connections(artist_name)
+                degree = graph.degree_centrality(artist_name)
+                betweenness = graph.betweenness_centrality(artist_name)
+
+                artist_info = {
+                    'details': artist_details,
+                    'connections': connections,
+                    'influence': {
+                        'degree_centrality': degree,
+                        'betweenness_centrality': betweenness
+                    }
                 }
-            }
-            return jsonify(artist_info), 200
-        else:
-            return jsonify({'error': 'Artist not found'}), 404
+                return jsonify(artist_info), 200
+            else:
+                return jsonify({'error': 'Artist not found'}), 404
     except KeyError:
         return jsonify({'error': 'Artist not found'}), 403
     except Exception as e:
@@ -103,15 +128,17 @@ def artist_details(artist_name):
     Raises:
         HTTP 404: If the specified artist cannot be found in the graph.
     """
+    graph = select_graph()
     try:
-        connections = artist_graph.get_connections(artist_name)
-        genres = artist_graph.get_genres_for_artists(connections)
+        with graph.lock:
+            connections = graph.get_connections(artist_name)
+            genres = graph.get_genres_for_artists(connections)
         
-        details = {
-            'connections': connections,
-            'genres': genres
-        }
-        return jsonify(details), 200
+            details = {
+                'connections': connections,
+                'genres': genres
+            }
+            return jsonify(details), 200
     except KeyError:
         return jsonify({'error': 'Artist not found'}), 404
 
@@ -128,9 +155,11 @@ def get_popular_artists():
     Raises:
         HTTP 500: If there is an internal server error while processing the request.
     """
+    graph = select_graph()
     try:
-        popular_artists = artist_graph.recommend_popular_artists()
-        return jsonify(popular_artists), 200
+        with graph.lock:
+            popular_artists = graph.recommend_popular_artists()
+            return jsonify(popular_artists), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -138,13 +167,15 @@ def get_popular_artists():
 @main.route('/api/recommend/<artist_name>/influence', methods=['GET'])
 def artist_influence(artist_name):
     """Return influence metrics for the specified artist within the network."""
+    graph = select_graph()
     try:
-        degree = artist_graph.degree_centrality(artist_name)
-        betweenness = artist_graph.betweenness_centrality(artist_name)
-        return jsonify({
-            'degree_centrality': degree,
-            'betweenness_centrality': betweenness
-        }), 200
+        with graph.lock:
+            degree = graph.degree_centrality(artist_name)
+            betweenness = graph.betweenness_centrality(artist_name)
+            return jsonify({
+                'degree_centrality': degree,
+                'betweenness_centrality': betweenness
+            }), 200
     except KeyError:
         return jsonify({'error': 'Artist not found'}), 404
     except Exception as e:
@@ -155,20 +186,102 @@ def get_extended_connections(artist_name):
     """
     Return extended connections of the specified artist, exploring up to second-degree connections.
     """
+    graph = select_graph()
     try:
-        first_degree_connections = artist_graph.get_connections(artist_name)
-        extended_connections = {}
+        with graph.lock:
+            first_degree_connections = graph.get_connections(artist_name)
+            extended_connections = {}
 
-        for connection in first_degree_connections:
-            secondary_connections = artist_graph.get_connections(connection)
-            extended_connections[connection] = secondary_connections
+            for connection in first_degree_connections:
+                secondary_connections = graph.get_connections(connection)
+                extended_connections[connection] = secondary_connections
 
-        return jsonify({
-            'first_degree': first_degree_connections,
-            'extended': extended_connections
-        }), 200
+            return jsonify({
+                'first_degree': first_degree_connections,
+                'extended': extended_connections
+            }), 200
     except KeyError:
         return jsonify({'error': 'Artist not found'}), 404
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@main.route('/api/artists/batch', methods=['POST'])
+def artists_batch():
+    """
+    Return information about several artists from a single graph snapshot.
+
+    Expects a JSON body such as
+    `{"artists": ["Taylor Swift", "Hozier"], "fields": ["details", "degree"]}`.
+    `fields` is optional and defaults to every field in ARTIST_INFO_FIELDS when omitted.
+    Artist names are matched exactly as sent.
+
+    Returns:
+        jsonify: A JSON response with the requested fields for each artist found and
+                 the list of artists missing from the graph.
+
+    Raises:
+        HTTP 400: If the artist list or the field mask is invalid.
+    """
+    graph = select_graph()
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({'error': 'Expected a JSON object body'}), 400
+    artists = payload.get('artists')
+    fields = payload.get('fields', ARTIST_INFO_FIELDS)
+
+    if not isinstance(artists, list) or not all(isinstance(artist, str) for artist in artists):
+        return jsonify({'error': 'artists must be a list of artist names'}), 400
+    if not isinstance(fields, (list, tuple)) or not all(isinstance(field, str) for field in fields):
+        return jsonify({'error': 'fields must be a list of field names'}), 400
+    unknown_fields = [field for field in fields if field not in ARTIST_INFO_FIELDS]
+    if unknown_fields:
+        return jsonify({'error': f"Unknown fields: {', '.join(unknown_fields)}"}), 400
+
+    try:
+        with graph.lock:
+            found, missing = graph.get_artists_info(artists, fields)
+            return jsonify({'artists': found, 'missing': missing}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@main.route('/api/artists/<artist1>/path/<artist2>', methods=['GET'])
+def artist_path(artist1, artist2):
+    """
+    Return the shortest chain of connected artists between two artists.
+    Use `?scope=global` to search across every category merged so far.
+    """
+    graph = select_graph()
+    try:
+        with graph.lock:
+            path = graph.find_shortest_path(artist1, artist2)
+            if path is None:
+                return jsonify({'error': 'No path found'}), 404
+            return jsonify({'path': path}), 200
+    except nx.NodeNotFound:
+        return jsonify({'error': 'Artist not found'}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@main.route('/api/global/artist_network', methods=['GET'])
+def global_artist_network():
+    """Return the union graph of every category snapshot merged so far."""
+    with global_graph.lock:
+        data = nx.readwrite.json_graph.node_link_data(global_graph.graph)
+    # The per-category contributions are bookkeeping for merges, not part of the network
+    data['graph'] = {}
+    return jsonify(data)
+
+@main.route('/api/global/backfill', methods=['POST'])
+def global_backfill():
+    """Merge every cached category snapshot in `data/` into the union graph."""
+    try:
+        with global_graph.lock:
+            merged, skipped = global_graph.backfill()
+            return jsonify({
+                'merged': merged,
+                'skipped': skipped,
+                'snapshots': len(global_graph.merged_snapshots()),
+                'artists': global_graph.graph.number_of_nodes()
+            }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -78,17 +78,25 @@ function drawGraph(graph) {
         .text(d => d.name);
 
     node.on('click', function(event, d) {
-        fetch(`/api/related_artists/${d.id}`)
-            .then(response => response.json())
-            .then(data => {
-                console.log('Related Artists:', data); 
-            });
-    
-        fetch(`/api/artist_influence/${d.id}`)
+        fetch('/api/artists/batch', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                artists: [d.id],
+                fields: ['connections', 'degree', 'betweenness']
+            })
+        })
             .then(response => response.json())
             .then(data => {
-                console.log('Artist Influence:', data);
-            });
+                const info = data.artists && data.artists[d.id];
+                if (!info) return;
+                console.log('Related Artists:', info.connections);
+                console.log('Artist Influence:', {
+                    degree_centrality: info.degree,
+                    betweenness_centrality: info.betweenness
+                });
+            })
+            .catch(error => console.error('Error fetching artist info:', error));
     });
 
     simulation.on("tick", () => {